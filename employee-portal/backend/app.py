@@ -1,18 +1,29 @@
 #!/usr/bin/env python3
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from jose import jwt
 from botocore.exceptions import ClientError
 from datetime import datetime
 from functools import wraps
-from ldap3.core.exceptions import LDAPException
+from ldap3.core.exceptions import LDAPException, LDAPBindError, LDAPInvalidCredentialsResult
 import boto3
 import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import Json
 import os
 import requests
 import json
+import heapq
+import hashlib
+import itertools
+import tempfile
 from ldap3 import Server, Connection, ALL, NONE, NTLM, MODIFY_REPLACE, MODIFY_ADD, Tls
 import time
+import sys
+import threading
+from collections import deque, Counter
+import random
+import uuid
 
 app = Flask(__name__)
 CORS(app)
@@ -22,6 +33,13 @@ DB_HOST = os.environ.get('DB_HOST', 'localhost')
 DB_NAME = os.environ.get('DB_NAME', 'employees')
 DB_USER = os.environ.get('DB_USER', 'admin')
 DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
+
+# Optional read replica for read-only routes (unset = everything goes to DB_HOST)
+DB_READ_DSN = os.environ.get('DB_READ_DSN', '')
+DB_READ_MAX_LAG_SECONDS = float(os.environ.get('DB_READ_MAX_LAG_SECONDS', '5'))
+DB_READ_LAG_CHECK_SECONDS = float(os.environ.get('DB_READ_LAG_CHECK_SECONDS', '5'))
+DB_READ_PIN_SECONDS = int(os.environ.get('DB_READ_PIN_SECONDS', '30'))
+DB_READ_PIN_COOKIE = 'db_read_pin'
 AWS_REGION = os.environ.get('AWS_REGION', 'eu-central-1')
 USER_POOL_ID = os.environ.get('COGNITO_USER_POOL_ID', '')
 COGNITO_ISSUER = f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{USER_POOL_ID}"
@@ -29,17 +47,301 @@ COGNITO_CLIENT_ID = os.environ.get('COGNITO_CLIENT_ID')
 
 # WorkSpaces & AD Configuration
 AD_HOST = os.environ.get('AD_HOST', 'innovatech.local')
+AD_SERVER = os.environ.get('AD_DNS_IP', '10.0.41.73')
 DIRECTORY_ID = os.environ.get('AD_DIRECTORY_ID', '')
 BUNDLE_ID = os.environ.get('AD_BUNDLE_ID', '')
 
+# Drift reconciliation: max records held in memory per source before spilling a sorted run to disk
+DRIFT_SORT_CHUNK = int(os.environ.get('DRIFT_SORT_CHUNK', '5000'))
+DRIFT_PAGE_SIZE = int(os.environ.get('DRIFT_PAGE_SIZE', '500'))
+DRIFT_HEARTBEAT_SECONDS = int(os.environ.get('DRIFT_HEARTBEAT_SECONDS', '15'))
+DRIFT_JOB_STALE_SECONDS = int(os.environ.get('DRIFT_JOB_STALE_SECONDS', '120'))
+# Advisory lock key held by the running drift job (one scan at a time cluster-wide)
+DRIFT_JOB_LOCK_ID = 0x44524654
+
+# Employee typeahead search (pg_trgm word similarity; lower = more typo tolerant)
+SEARCH_SIMILARITY_THRESHOLD = float(os.environ.get('SEARCH_SIMILARITY_THRESHOLD', '0.3'))
+SEARCH_MAX_LIMIT = 50
+EMPLOYEES_PAGE_SIZE = 50
+EMPLOYEES_MAX_PAGE_SIZE = 500
+# pg_trgm cannot extract trigrams from a shorter infix pattern, so below this only prefixes are matched
+SEARCH_MIN_FUZZY_LENGTH = 3
+
+# Circuit breakers: trip when >= BREAKER_FAILURE_RATE of calls in the window fail
+BREAKER_WINDOW_SECONDS = int(os.environ.get('BREAKER_WINDOW_SECONDS', '60'))
+BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', '5'))
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_OPEN_SECONDS = int(os.environ.get('BREAKER_OPEN_SECONDS', '30'))
+
+# AD service account secret: refreshed in the background before the TTL runs out
+AD_SECRET_ID = os.environ.get('AD_SECRET_ID', 'cs3-ad-service-account')
+AD_SECRET_TTL_SECONDS = int(os.environ.get('AD_SECRET_TTL_SECONDS', '3600'))
+AD_SECRET_REFRESH_AHEAD_SECONDS = int(os.environ.get('AD_SECRET_REFRESH_AHEAD_SECONDS', '300'))
+AD_SECRET_RETRY_SECONDS = int(os.environ.get('AD_SECRET_RETRY_SECONDS', '30'))
+
+# On-demand profiling: no request hooks are installed unless PROFILE_ENABLED is set
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS', '0'))
+PROFILE_INTERVAL_MS = int(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '20'))
+
+# Idempotency-Key handling for mutating lifecycle routes
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_WAIT_SECONDS = int(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '120'))
+
 # Initialize AWS Clients
 cognito = boto3.client('cognito-idp', region_name=AWS_REGION)
 workspaces = boto3.client('workspaces', region_name=AWS_REGION)
 secretsmanager = boto3.client('secretsmanager', region_name=AWS_REGION)
 ds_client = boto3.client('ds', region_name=AWS_REGION)
 
-# Cache service account credentials
-_ad_service_creds = None
+# --- CIRCUIT BREAKERS ---
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding time window.
+
+    closed: calls flow, outcomes are recorded. open: calls fail fast until
+    open_seconds pass. half_open: one probe call is let through; its outcome
+    closes or re-opens the breaker.
+    """
+
+    def __init__(self, name, window_seconds=None, min_calls=None, failure_rate=None, open_seconds=None):
+        self.name = name
+        self.window_seconds = window_seconds or BREAKER_WINDOW_SECONDS
+        self.min_calls = min_calls or BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate or BREAKER_FAILURE_RATE
+        self.open_seconds = open_seconds or BREAKER_OPEN_SECONDS
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.probe_started_at = None
+        self.last_error = None
+        self.rejected = 0
+        self.trips = 0
+        self._outcomes = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def allow(self):
+        """True if a call may proceed; callers must then record_success/record_failure"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'open' and now - self.opened_at >= self.open_seconds:
+                self.state = 'half_open'
+                self.probe_started_at = None
+            if self.state == 'half_open':
+                # One probe at a time; a probe that never reports back expires
+                if self.probe_started_at is None or now - self.probe_started_at >= self.open_seconds:
+                    self.probe_started_at = now
+                    return True
+            if self.state == 'closed':
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        """Raise CircuitOpenError if the call should fail fast"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} unavailable (circuit open, last error: {self.last_error})")
+
+    def record_success(self):
+        with self._lock:
+            if self.state == 'half_open':
+                print(f"✅ Circuit '{self.name}' closed after successful probe")
+                self.state = 'closed'
+                self._outcomes.clear()
+            now = time.monotonic()
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self, error=None):
+        with self._lock:
+            now = time.monotonic()
+            self.last_error = str(error) if error else self.last_error
+            if self.state == 'half_open':
+                self._open(now)
+                return
+            self._outcomes.append((now, False))
+            self._trim(now)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self.state == 'closed' and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = 'open'
+        self.opened_at = now
+        self.trips += 1
+        print(f"⛔ Circuit '{self.name}' opened for {self.open_seconds}s (last error: {self.last_error})")
+
+    def snapshot(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                'state': self.state,
+                'window_calls': len(self._outcomes),
+                'window_failures': failures,
+                'rejected': self.rejected,
+                'trips': self.trips,
+                'last_error': self.last_error
+            }
+
+BREAKERS = {
+    'ad': CircuitBreaker('ad'),
+    'directory_service': CircuitBreaker('directory_service'),
+    'workspaces': CircuitBreaker('workspaces'),
+    'cognito': CircuitBreaker('cognito')
+}
+
+# Service-side trouble counts against a breaker; ordinary client errors (4xx) do not
+BREAKER_ERROR_CODES = ('ThrottlingException', 'RequestLimitExceeded', 'TooManyRequestsException')
+
+def attach_breaker(client, breaker):
+    """Guard every API call of a boto3 client with a breaker via botocore events"""
+    def before_call(**kwargs):
+        breaker.check()
+
+    def after_call(http_response=None, parsed=None, **kwargs):
+        error_code = (parsed or {}).get('Error', {}).get('Code')
+        if (http_response is not None and http_response.status_code >= 500) or error_code in BREAKER_ERROR_CODES:
+            breaker.record_failure(error_code or f"HTTP {http_response.status_code}")
+        else:
+            breaker.record_success()
+
+    def after_call_error(exception=None, **kwargs):
+        breaker.record_failure(exception)
+
+    client.meta.events.register('before-call', before_call)
+    client.meta.events.register('after-call', after_call)
+    client.meta.events.register('after-call-error', after_call_error)
+
+@app.errorhandler(CircuitOpenError)
+def circuit_open(e):
+    return jsonify({'error': str(e)}), 503
+
+attach_breaker(cognito, BREAKERS['cognito'])
+attach_breaker(workspaces, BREAKERS['workspaces'])
+attach_breaker(ds_client, BREAKERS['directory_service'])
+
+# --- SECRET CACHE ---
+class SecretCache:
+    """Secrets Manager value cached with a TTL.
+
+    Reads never wait on Secrets Manager once a value is loaded: within
+    refresh_ahead seconds of expiry a background thread fetches a new value,
+    and if that fails the stale value keeps being served (retried every
+    retry_seconds). refresh_now() forces a synchronous fetch, e.g. after a bind
+    fails with invalid credentials, but at most once per retry_seconds.
+    """
+
+    def __init__(self, secret_id, ttl_seconds, refresh_ahead_seconds, retry_seconds, fallback=None):
+        self.secret_id = secret_id
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead_seconds = min(refresh_ahead_seconds, ttl_seconds)
+        self.retry_seconds = retry_seconds
+        self.fallback = fallback
+        self.value = None
+        self.source = None
+        # -inf, not 0.0: monotonic() counts from boot, so 0.0 would look "recent" on a fresh node
+        self.fetched_at = float('-inf')
+        self.next_attempt_at = float('-inf')
+        self.last_error = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        # Serializes synchronous fetches so concurrent callers share one round trip
+        self._fetch_lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self.value is None:
+            with self._fetch_lock:
+                if self.value is None:
+                    self.refresh()
+        elif now >= self.next_attempt_at and self._needs_refresh(now):
+            self._refresh_in_background()
+        return self.value
+
+    def _needs_refresh(self, now):
+        # A fallback value is always stale: keep retrying Secrets Manager every retry_seconds
+        if self.source != 'secretsmanager':
+            return True
+        return now - self.fetched_at >= self.ttl_seconds - self.refresh_ahead_seconds
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name=f'refresh-{self.secret_id}', daemon=True).start()
+
+    def refresh_now(self):
+        """Synchronous refresh, skipped if a fetch was attempted within retry_seconds"""
+        with self._fetch_lock:
+            now = time.monotonic()
+            last_attempt = max(self.fetched_at, self.next_attempt_at - self.retry_seconds)
+            if now - last_attempt < self.retry_seconds:
+                return False
+            return self.refresh()
+
+    def refresh(self):
+        """Fetch now; on failure keep the current value (or the fallback) and back off"""
+        with self._lock:
+            self._refreshing = True
+        try:
+            response = secretsmanager.get_secret_value(SecretId=self.secret_id)
+            value = json.loads(response['SecretString'])
+            with self._lock:
+                changed = value != self.value
+                self.value = value
+                self.source = 'secretsmanager'
+                self.fetched_at = time.monotonic()
+                self.next_attempt_at = self.fetched_at
+                self.last_error = None
+            print(f"✅ Refreshed secret {self.secret_id} from Secrets Manager")
+            return changed
+        except Exception as e:
+            with self._lock:
+                self.last_error = str(e)
+                self.next_attempt_at = time.monotonic() + self.retry_seconds
+                if self.value is None and self.fallback:
+                    # Served only until the next successful fetch, never pinned
+                    self.value = self.fallback()
+                    self.source = 'fallback'
+            print(f"⚠️ Could not refresh secret {self.secret_id}: {e} (serving {self.source or 'nothing'})")
+            return False
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def status(self):
+        with self._lock:
+            return {
+                'source': self.source,
+                'age_seconds': int(time.monotonic() - self.fetched_at) if self.source == 'secretsmanager' else None,
+                'last_error': self.last_error
+            }
+
+def _ad_env_credentials():
+    """Environment fallback (for local testing) when Secrets Manager is unreachable"""
+    print("⚠️ Falling back to AD_USER/AD_PASSWORD environment credentials")
+    return {
+        'username': os.environ.get('AD_USER', 'Admin'),
+        'password': os.environ.get('AD_PASSWORD', '')
+    }
+
+ad_secret = SecretCache(
+    AD_SECRET_ID,
+    ttl_seconds=AD_SECRET_TTL_SECONDS,
+    refresh_ahead_seconds=AD_SECRET_REFRESH_AHEAD_SECONDS,
+    retry_seconds=AD_SECRET_RETRY_SECONDS,
+    fallback=_ad_env_credentials
+)
 
 print("=" * 80)
 print("🔧 ENVIRONMENT CONFIGURATION")
@@ -47,6 +349,7 @@ print("=" * 80)
 print(f"DB_HOST: {DB_HOST}")
 print(f"DB_NAME: {DB_NAME}")
 print(f"DB_USER: {DB_USER}")
+print(f"DB Read Replica Enabled: {bool(DB_READ_DSN)}")
 print(f"COGNITO_USER_POOL_ID: {USER_POOL_ID}")
 print(f"COGNITO_CLIENT_ID: {COGNITO_CLIENT_ID}")
 print(f"AWS_REGION: {AWS_REGION}")
@@ -59,168 +362,299 @@ print("=" * 80)
 def get_db():
     return psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD)
 
+# Last replica health check, shared by all request threads
+_replica_state = {'checked_at': 0.0, 'healthy': False, 'lag_seconds': None, 'error': None}
+_replica_lock = threading.Lock()
+_replica_probe_lock = threading.Lock()
+
+def _replica_lag(conn):
+    """Replay lag in seconds; 0 when caught up (an idle primary must not look like lag)"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """)
+    lag = float(cur.fetchone()[0])
+    cur.close()
+    return lag
+
+def _read_pinned_to_primary():
+    """Read-your-writes: an admin who just changed data reads from the primary for a while"""
+    try:
+        return float(request.cookies.get(DB_READ_PIN_COOKIE, 0)) > time.time()
+    except (RuntimeError, ValueError):
+        # Outside a request context or a malformed cookie
+        return False
+
+def _connect_replica():
+    return psycopg2.connect(DB_READ_DSN, connect_timeout=2)
+
+def _probe_replica(now):
+    """Connect and measure lag, updating _replica_state; returns the connection if usable"""
+    try:
+        conn = _connect_replica()
+    except Exception as e:
+        with _replica_lock:
+            _replica_state.update(checked_at=now, healthy=False, error=str(e))
+        print(f"⚠️ Read replica unavailable, using primary: {e}")
+        return None
+
+    try:
+        lag = _replica_lag(conn)
+        conn.rollback()
+        with _replica_lock:
+            _replica_state.update(checked_at=now, healthy=lag <= DB_READ_MAX_LAG_SECONDS,
+                                  lag_seconds=round(lag, 3), error=None)
+        if lag > DB_READ_MAX_LAG_SECONDS:
+            print(f"⚠️ Read replica lag {lag:.1f}s exceeds {DB_READ_MAX_LAG_SECONDS}s, using primary")
+    except Exception as e:
+        with _replica_lock:
+            _replica_state.update(checked_at=now, healthy=False, error=str(e))
+
+    if not _replica_state['healthy']:
+        conn.close()
+        return None
+    return conn
+
+def get_read_db():
+    """Connection for read-only queries: the replica if configured, fresh enough and not pinned"""
+    if not DB_READ_DSN or _read_pinned_to_primary():
+        return get_db()
+
+    # Lag is re-measured at most every DB_READ_LAG_CHECK_SECONDS, and by one thread only;
+    # everyone else goes by the last result instead of piling onto a dead replica
+    now = time.monotonic()
+    if now - _replica_state['checked_at'] >= DB_READ_LAG_CHECK_SECONDS and _replica_probe_lock.acquire(blocking=False):
+        try:
+            return _probe_replica(now) or get_db()
+        finally:
+            _replica_probe_lock.release()
+
+    if not _replica_state['healthy']:
+        return get_db()
+    try:
+        return _connect_replica()
+    except Exception as e:
+        with _replica_lock:
+            _replica_state.update(checked_at=now, healthy=False, error=str(e))
+        print(f"⚠️ Read replica unavailable, using primary: {e}")
+        return get_db()
+
+def _pin_reads_after_admin_write(response):
+    """Read-your-writes: after a successful admin change, route that admin's reads to the primary"""
+    if (request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and g.get('admin_claims')
+            and response.status_code < 400):
+        response.set_cookie(DB_READ_PIN_COOKIE, str(int(time.time()) + DB_READ_PIN_SECONDS),
+                            max_age=DB_READ_PIN_SECONDS, httponly=True, samesite='Strict')
+    return response
+
+if DB_READ_DSN:
+    app.after_request(_pin_reads_after_admin_write)
+
 # --- SERVICE ACCOUNT FUNCTIONS ---
 def get_ad_service_credentials():
-    """Retrieve service account credentials from Secrets Manager"""
-    global _ad_service_creds
-    
-    if _ad_service_creds is None:
-        try:
-            response = secretsmanager.get_secret_value(SecretId='cs3-ad-service-account')
-            _ad_service_creds = json.loads(response['SecretString'])
-            print("✅ Retrieved AD service account credentials from Secrets Manager")
-        except Exception as e:
-            print(f"⚠️ Could not retrieve service credentials: {e}")
-            print(f"⚠️ Falling back to default Admin account")
-            # Fallback to environment variables (for local testing)
-            _ad_service_creds = {
-                'username': os.environ.get('AD_USER', 'Admin'),
-                'password': os.environ.get('AD_PASSWORD', '')
-            }
+    """Service account credentials from the Secrets Manager cache"""
+    return ad_secret.get()
+
+def _bind_ad(creds):
+    server = Server(
+        AD_SERVER,
+        port=389,
+        use_ssl=False,  # Plain LDAP
+        get_info=NONE,
+        connect_timeout=5
+    )
     
-    return _ad_service_creds
+    return Connection(
+        server,
+        user=f'INNOVATECH\\{creds["username"]}',
+        password=creds['password'],
+        authentication=NTLM,
+        auto_bind=True,
+        raise_exceptions=True
+    )
 
 def get_ad_connection():
     """Plain LDAP connection (no SSL) - acceptable for VPC-internal communication"""
+    breaker = BREAKERS['ad']
+    if not breaker.allow():
+        print(f"⛔ AD circuit open - skipping LDAP bind to {AD_SERVER}")
+        return None
+
     creds = get_ad_service_credentials()
+    if not creds or not creds.get('password'):
+        # Empty fallback: try Secrets Manager again now (rate limited) rather than wait for a bind
+        ad_secret.refresh_now()
+        creds = get_ad_service_credentials()
     if not creds or not creds.get('password'):
         print("❌ No AD credentials available")
         return None
     
     try:
-        ad_server = '10.0.41.73'
-        
-        server = Server(
-            ad_server,
-            port=389,
-            use_ssl=False,  # Plain LDAP
-            get_info=NONE,
-            connect_timeout=5
-        )
-        
-        conn = Connection(
-            server,
-            user=f'INNOVATECH\\{creds["username"]}',
-            password=creds['password'],
-            authentication=NTLM,
-            auto_bind=True,
-            raise_exceptions=True
-        )
+        try:
+            conn = _bind_ad(creds)
+        except (LDAPBindError, LDAPInvalidCredentialsResult) as e:
+            # Likely a rotated password: refetch (rate limited) and rebind once if it changed,
+            # including when another thread has already picked up the new value
+            print(f"⚠️ AD bind rejected ({e}) - refreshing service account secret")
+            ad_secret.refresh_now()
+            new_creds = ad_secret.get()
+            if not new_creds or new_creds == creds:
+                raise
+            conn = _bind_ad(new_creds)
         
-        print(f"✅ Connected to AD (LDAP) at {ad_server}:389")
+        breaker.record_success()
+        print(f"✅ Connected to AD (LDAP) at {AD_SERVER}:389")
         return conn
         
     except Exception as e:
+        breaker.record_failure(e)
         print(f"❌ AD connection failed: {e}")
-        import traceback
-        traceback.print_exc()
         return None
 
-def ensure_ou_structure():
-    """Create OU structure if it doesn't exist - runs on startup"""
-    print("🏗️ Ensuring AD OU structure...")
-    
-    conn = get_ad_connection()
-    if not conn:
-        print("⚠️ Cannot verify OU structure - no AD connection")
-        return False
-    
-    base_dn = "OU=innovatech,DC=innovatech,DC=local"
-    
-    ous = [
-        {
-            'dn': f'OU=Employees,{base_dn}',
-            'description': 'Standard employees'
-        },
-        {
-            'dn': f'OU=Developers,{base_dn}',
-            'description': 'Software developers'
-        },
-        {
-            'dn': f'OU=Admins,{base_dn}',
-            'description': 'IT administrators'
-        }
-    ]
-    
-    for ou in ous:
-        try:
-            # Check if exists
-            if conn.search(ou['dn'], '(objectClass=organizationalUnit)', search_scope='BASE'):
-                print(f"✓ OU exists: {ou['dn']}")
-                continue
-            
-            # Create if doesn't exist
-            attributes = {
+def ad_unavailable_response():
+    """Error response for AD-backed routes, fast 503 when the breaker is open"""
+    if BREAKERS['ad'].state == 'open':
+        return jsonify({'error': 'Active Directory unavailable (circuit open)', 'circuit': BREAKERS['ad'].snapshot()}), 503
+    return jsonify({'error': 'Could not connect to AD'}), 500
+
+# --- AD LAYOUT (single source of truth for OUs, groups and role mapping) ---
+AD_DOMAIN_DN = "DC=innovatech,DC=local"
+AD_BASE_DN = f"OU=innovatech,{AD_DOMAIN_DN}"
+AD_DEFAULT_ROLE = 'Employee'
+GLOBAL_SECURITY_GROUP = -2147483646
+
+# One entry per role: where its users/computers live and which group they join.
+# Adding a role here is enough for bootstrap, onboarding and computer sync.
+AD_LAYOUT = {
+    'Employee': {
+        'ou': 'Employees',
+        'ou_description': 'Standard employees',
+        'group': 'EmployeesGroup',
+        'group_description': 'Standard employees'
+    },
+    'Developer': {
+        'ou': 'Developers',
+        'ou_description': 'Software developers',
+        'group': 'DevelopersGroup',
+        'group_description': 'Developers with code access'
+    },
+    'Admin': {
+        'ou': 'Admins',
+        'ou_description': 'IT administrators',
+        'group': 'AdminsGroup',
+        'group_description': 'IT Administrators'
+    }
+}
+
+def role_ou_dn(role):
+    """DN of the OU a role's objects belong in (unknown roles fall back to Employee)"""
+    layout = AD_LAYOUT.get(role, AD_LAYOUT[AD_DEFAULT_ROLE])
+    return f"OU={layout['ou']},{AD_BASE_DN}"
+
+def role_group_dn(role):
+    """DN of the security group for a role (unknown roles fall back to Employee)"""
+    layout = AD_LAYOUT.get(role, AD_LAYOUT[AD_DEFAULT_ROLE])
+    return f"CN={layout['group']},{AD_BASE_DN}"
+
+def desired_ad_objects():
+    """Expand AD_LAYOUT into the LDAP entries that must exist, keyed by lowercased DN"""
+    desired = {}
+    for role in AD_LAYOUT.values():
+        ou_dn = f"OU={role['ou']},{AD_BASE_DN}"
+        desired[ou_dn.lower()] = {
+            'dn': ou_dn,
+            'kind': 'ou',
+            'attributes': {
                 'objectClass': ['top', 'organizationalUnit'],
-                'ou': ou['dn'].split(',')[0].split('=')[1],
-                'description': ou['description']
+                'ou': role['ou'],
+                'description': role['ou_description']
             }
-            
-            success = conn.add(ou['dn'], attributes=attributes)
-            if success:
-                print(f"✅ Created OU: {ou['dn']}")
-            else:
-                print(f"❌ Failed to create OU: {conn.result}")
-                
-        except Exception as e:
-            print(f"⚠️ OU check/create error for {ou['dn']}: {e}")
-    
-    conn.unbind()
-    return True
-
-def ensure_security_groups():
-    """Create AD security groups if they don't exist"""
-    print("👥 Ensuring AD security groups...")
-    
-    conn = get_ad_connection()
-    if not conn:
-        return False
-    
-    base_dn = "OU=innovatech,DC=innovatech,DC=local"
-    
-    groups = [
-        {
-            'dn': f'CN=DevelopersGroup,{base_dn}',
-            'name': 'DevelopersGroup',
-            'description': 'Developers with code access'
-        },
-        {
-            'dn': f'CN=AdminsGroup,{base_dn}',
-            'name': 'AdminsGroup',
-            'description': 'IT Administrators'
-        },
-        {
-            'dn': f'CN=EmployeesGroup,{base_dn}',
-            'name': 'EmployeesGroup',
-            'description': 'Standard employees'
         }
-    ]
-    
-    for group in groups:
-        try:
-            if conn.search(group['dn'], '(objectClass=group)', search_scope='BASE'):
-                print(f"✓ Group exists: {group['name']}")
-                continue
-            
-            attributes = {
+        group_dn = f"CN={role['group']},{AD_BASE_DN}"
+        desired[group_dn.lower()] = {
+            'dn': group_dn,
+            'kind': 'group',
+            'attributes': {
                 'objectClass': ['top', 'group'],
-                'cn': group['name'],
-                'sAMAccountName': group['name'],
-                'description': group['description'],
-                'groupType': -2147483646  # Global security group
+                'cn': role['group'],
+                'sAMAccountName': role['group'],
+                'description': role['group_description'],
+                'groupType': GLOBAL_SECURITY_GROUP
             }
-            
-            success = conn.add(group['dn'], attributes=attributes)
-            if success:
-                print(f"✅ Created group: {group['name']}")
+        }
+    return desired
+
+def reconcile_ad_structure(dry_run=False, page_size=500):
+    """Diff AD_LAYOUT against AD with one paged subtree search and add what is missing.
+
+    Returns a report dict, or None if AD is unreachable. With dry_run=True
+    nothing is written and the report lists what would be created.
+    """
+    print(f"🏗️ Reconciling AD structure (dry_run={dry_run})...")
+
+    conn = get_ad_connection()
+    if not conn:
+        print("⚠️ Cannot reconcile AD structure - no AD connection")
+        return None
+
+    desired = desired_ad_objects()
+    report = {'dry_run': dry_run, 'existing': [], 'missing': [], 'created': [], 'errors': []}
+
+    try:
+        # 1. Fetch every OU and group under the base in a single paged search
+        actual = set()
+        entries = conn.extend.standard.paged_search(
+            AD_BASE_DN,
+            '(|(objectClass=organizationalUnit)(objectClass=group))',
+            search_scope='SUBTREE',
+            attributes=['distinguishedName'],
+            paged_size=page_size,
+            generator=True
+        )
+        for entry in entries:
+            if entry.get('type') == 'searchResEntry':
+                actual.add(entry['dn'].lower())
+
+        # 2. Diff desired against actual (parents first, so OUs precede their children)
+        for key in sorted(desired, key=lambda k: k.count(',')):
+            obj = desired[key]
+            if key in actual:
+                report['existing'].append(obj['dn'])
             else:
-                print(f"❌ Failed: {conn.result}")
-                
-        except Exception as e:
-            print(f"⚠️ Group error for {group['name']}: {e}")
-    
-    conn.unbind()
-    return True
+                report['missing'].append({'dn': obj['dn'], 'kind': obj['kind']})
+
+        if dry_run:
+            for item in report['missing']:
+                print(f"📝 Would create {item['kind']}: {item['dn']}")
+            return report
+
+        # 3. Apply only the missing adds
+        for item in report['missing']:
+            obj = desired[item['dn'].lower()]
+            try:
+                if conn.add(obj['dn'], attributes=obj['attributes']):
+                    print(f"✅ Created {obj['kind']}: {obj['dn']}")
+                    report['created'].append(obj['dn'])
+                else:
+                    print(f"❌ Failed to create {obj['kind']} {obj['dn']}: {conn.result}")
+                    report['errors'].append(f"{obj['dn']}: {conn.result.get('description')}")
+            except Exception as e:
+                print(f"⚠️ Create error for {obj['dn']}: {e}")
+                report['errors'].append(f"{obj['dn']}: {e}")
+
+        print(f"✓ AD structure: {len(report['existing'])} present, {len(report['created'])} created")
+        return report
+
+    except Exception as e:
+        print(f"⚠️ AD structure reconcile error: {e}")
+        report['errors'].append(str(e))
+        return report
+    finally:
+        conn.unbind()
 
 # --- SECURITY: TOKEN VERIFICATION ---
 def verify_token(token):
@@ -255,9 +689,229 @@ def admin_required(f):
         if 'admins' not in groups:
             return jsonify({'error': 'Access Denied: Administrator privileges required'}), 403
             
+        g.admin_claims = claims
         return f(*args, **kwargs)
     return decorated_function
 
+def idempotent(f):
+    """Make a route safe to retry with an Idempotency-Key header.
+
+    The first request holds a Postgres advisory lock on the key while it runs, so
+    concurrent duplicates block until it finishes and then replay its stored
+    response. 5xx responses are not stored, so a failed attempt can be retried.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': 'Idempotency-Key must be at most 255 characters'}), 400
+
+        scope = request.path
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        conn = None
+        try:
+            conn = get_db()
+            conn.autocommit = True
+            cur = conn.cursor()
+
+            # 1. Serialize on the key; waiters give up after IDEMPOTENCY_WAIT_SECONDS
+            cur.execute("SET statement_timeout = %s", (IDEMPOTENCY_WAIT_SECONDS * 1000,))
+            try:
+                cur.execute("SELECT pg_advisory_lock(hashtextextended(%s, 0))", (f'{scope}:{key}',))
+            except psycopg2.extensions.QueryCanceledError:
+                conn.close()
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            cur.execute("SET statement_timeout = 0")
+
+            # 2. Replay a stored result
+            cur.execute("""
+                SELECT request_hash, status_code, response_body
+                FROM idempotency_keys
+                WHERE idempotency_key = %s AND scope = %s AND expires_at > CURRENT_TIMESTAMP
+            """, (key, scope))
+            stored = cur.fetchone()
+        except Exception as e:
+            # Without the key store we cannot promise exactly-once, so refuse rather than run
+            print(f"Idempotency store unavailable: {e}")
+            if conn is not None:
+                conn.close()
+            return jsonify({'error': 'Idempotency store unavailable, retry later'}), 503
+
+        try:
+            if stored:
+                if stored[0] != request_hash:
+                    return jsonify({'error': 'Idempotency-Key was already used with a different request body'}), 422
+                print(f"↩️ Replaying stored response for Idempotency-Key {key}")
+                response = jsonify(stored[2])
+                response.status_code = stored[1]
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            # 3. First execution: run it and store the outcome unless it was a server error
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code < 500 and response.is_json:
+                try:
+                    cur.execute("DELETE FROM idempotency_keys WHERE expires_at <= CURRENT_TIMESTAMP")
+                    cur.execute("""
+                        INSERT INTO idempotency_keys
+                        (idempotency_key, scope, request_hash, status_code, response_body, expires_at)
+                        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))
+                        ON CONFLICT (idempotency_key, scope) DO UPDATE
+                        SET request_hash = EXCLUDED.request_hash,
+                            status_code = EXCLUDED.status_code,
+                            response_body = EXCLUDED.response_body,
+                            created_at = CURRENT_TIMESTAMP,
+                            expires_at = EXCLUDED.expires_at
+                    """, (key, scope, request_hash, response.status_code,
+                          Json(response.get_json()), IDEMPOTENCY_TTL_HOURS))
+                except Exception as e:
+                    # The work is done; the caller must still get its real result
+                    print(f"⚠️ Could not store result for Idempotency-Key {key}: {e}")
+            return response
+        finally:
+            # Closing the session releases the advisory lock
+            try:
+                conn.close()
+            except Exception:
+                pass
+    return decorated_function
+
+# --- REQUEST PROFILING ---
+class RequestSampler:
+    """Statistical profiler for in-flight Flask requests.
+
+    A single daemon thread wakes every PROFILE_INTERVAL_MS and records the
+    stack of each tracked request thread (sys._current_frames). Forced requests
+    (admin header or sampling) are sampled from the start; other requests only
+    once they run past PROFILE_SLOW_MS, so slow tails are captured without
+    paying for fast requests. Profiles are kept as collapsed stacks, the input
+    format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval_ms, slow_ms, keep):
+        self.interval = interval_ms / 1000.0
+        self.slow = slow_ms / 1000.0 if slow_ms else None
+        self.profiles = deque(maxlen=keep)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id, forced):
+        with self._lock:
+            self._active[thread_id] = {'started': time.monotonic(), 'forced': forced, 'stacks': Counter()}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                eligible = [
+                    thread_id for thread_id, state in self._active.items()
+                    if state['forced'] or (self.slow is not None and now - state['started'] >= self.slow)
+                ]
+                # Earliest moment a tracked request could cross the slow threshold
+                next_due = None
+                if self._active and not eligible and self.slow is not None:
+                    next_due = min(state['started'] for state in self._active.values()) + self.slow - now
+
+            if not eligible:
+                # Nothing forced or slow yet: no frame snapshots, just sleep until one could be
+                self._wake.wait(timeout=max(next_due, self.interval) if next_due is not None else None)
+                self._wake.clear()
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in eligible:
+                    state = self._active.get(thread_id)
+                    frame = frames.get(thread_id)
+                    if state is not None and frame is not None:
+                        state['stacks'][self._collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def snapshot(self):
+        """Copy of the stored profiles, oldest first, safe against concurrent appends"""
+        with self._lock:
+            return list(self.profiles)
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def store(self, state, reason, method, path, status_code):
+        duration_ms = int((time.monotonic() - state['started']) * 1000)
+        profile = {
+            'id': uuid.uuid4().hex[:12],
+            'method': method,
+            'path': path,
+            'status_code': status_code,
+            'reason': reason,
+            'duration_ms': duration_ms,
+            'captured_at': datetime.now().isoformat(),
+            'samples': sum(state['stacks'].values()),
+            'collapsed': '\n'.join(f"{stack} {count}" for stack, count in state['stacks'].most_common())
+        }
+        with self._lock:
+            self.profiles.append(profile)
+        print(f"🔬 Captured profile {profile['id']} for {method} {path} ({duration_ms}ms, {reason})")
+
+profiler = RequestSampler(PROFILE_INTERVAL_MS, PROFILE_SLOW_MS, PROFILE_KEEP)
+
+def _is_admin_request():
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return False
+    claims = verify_token(auth_header.split(" ")[1] if " " in auth_header else auth_header)
+    return bool(claims) and 'admins' in claims.get('cognito:groups', [])
+
+def _profile_before_request():
+    reason = None
+    if request.headers.get('X-Profile') and _is_admin_request():
+        reason = 'requested'
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        reason = 'sampled'
+    elif not PROFILE_SLOW_MS:
+        return
+    g.profile_reason = reason
+    profiler.start(threading.get_ident(), forced=reason is not None)
+
+def _profile_teardown_request(exc):
+    state = profiler.stop(threading.get_ident())
+    if state is None:
+        return
+    reason = g.get('profile_reason')
+    elapsed_ms = (time.monotonic() - state['started']) * 1000
+    if reason is None and PROFILE_SLOW_MS and elapsed_ms >= PROFILE_SLOW_MS:
+        reason = 'slow'
+    if reason and state['stacks']:
+        profiler.store(state, reason, request.method, request.path, g.get('profile_status'))
+
+def _profile_after_request(response):
+    g.profile_status = response.status_code
+    return response
+
+if PROFILE_ENABLED:
+    app.before_request(_profile_before_request)
+    app.after_request(_profile_after_request)
+    app.teardown_request(_profile_teardown_request)
+
 # --- ACTIVE DIRECTORY FUNCTIONS ---
 def create_ad_user(username, first_name, last_name, email, role='Employee'):
     """Create AD user with AWS DS API for password"""
@@ -269,12 +923,7 @@ def create_ad_user(username, first_name, last_name, email, role='Employee'):
     
     try:
         # 1. Determine target OU
-        ou_map = {
-            'Developer': 'OU=Developers,OU=innovatech,DC=innovatech,DC=local',
-            'Admin': 'OU=Admins,OU=innovatech,DC=innovatech,DC=local',
-            'Employee': 'OU=Employees,OU=innovatech,DC=innovatech,DC=local'
-        }
-        target_ou = ou_map.get(role, 'OU=Employees,OU=innovatech,DC=innovatech,DC=local')
+        target_ou = role_ou_dn(role)
         user_dn = f'CN={first_name} {last_name},{target_ou}'
         
         # 2. Create user (disabled initially)
@@ -321,6 +970,10 @@ def create_ad_user(username, first_name, last_name, email, role='Employee'):
                     print(f"AWS DS password reset failed: {e}")
                     conn.unbind()
                     return False
+            except CircuitOpenError as e:
+                print(f"AWS DS password reset skipped: {e}")
+                conn.unbind()
+                return False
         
         if not password_set:
             print("Failed to set password after retries")
@@ -338,14 +991,7 @@ def create_ad_user(username, first_name, last_name, email, role='Employee'):
             print(f"Failed to enable account: {conn.result}")
         
         # 5. Add to security group
-        group_base_dn = "OU=innovatech,DC=innovatech,DC=local"
-        group_map = {
-            'Developer': f'CN=DevelopersGroup,{group_base_dn}',
-            'Admin': f'CN=AdminsGroup,{group_base_dn}',
-            'Employee': f'CN=EmployeesGroup,{group_base_dn}'
-        }
-        
-        target_group = group_map.get(role, f'CN=EmployeesGroup,{group_base_dn}')
+        target_group = role_group_dn(role)
         if conn.modify(target_group, {'member': [(MODIFY_ADD, [user_dn])]}):
             print(f"Added to group: {target_group}")
         
@@ -369,7 +1015,7 @@ def disable_ad_user(first_name, last_name):
     try:
         # 1. Find the user's correct DN (Distinguished Name)
         # We search the entire innovatech OU subtree
-        search_base = 'OU=innovatech,DC=innovatech,DC=local'
+        search_base = AD_BASE_DN
         search_filter = f'(&(objectClass=user)(cn={first_name} {last_name}))'
         
         conn.search(search_base, search_filter, attributes=['distinguishedName'])
@@ -449,6 +1095,113 @@ def health():
         'workspaces_enabled': bool(DIRECTORY_ID and BUNDLE_ID)
     })
 
+# Readiness DB check: short connect timeout, result reused for one probe period
+READY_DB_TIMEOUT_SECONDS = 1
+READY_CACHE_SECONDS = 5
+_ready_state = {'checked_at': 0.0, 'database': 'unknown'}
+_ready_lock = threading.Lock()
+
+def _ready_db_status():
+    """Cached DB reachability; only one probe thread at a time ever waits on connect"""
+    if time.monotonic() - _ready_state['checked_at'] < READY_CACHE_SECONDS:
+        return _ready_state['database']
+    if not _ready_lock.acquire(blocking=False):
+        # Another probe is already checking - answer with the last known state
+        return _ready_state['database']
+    try:
+        try:
+            conn = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+                                    connect_timeout=READY_DB_TIMEOUT_SECONDS)
+            conn.close()
+            database = 'ok'
+        except Exception as e:
+            print(f"Readiness DB check failed: {e}")
+            database = 'unavailable'
+        _ready_state.update(checked_at=time.monotonic(), database=database)
+        return database
+    finally:
+        _ready_lock.release()
+
+@app.route('/api/ready')
+def ready():
+    """Readiness: the database must answer; open dependency breakers only mark us degraded.
+
+    Public (probes hit it), so it reports states only; error details are in /api/admin/dependencies.
+    """
+    breakers = {name: breaker.state for name, breaker in BREAKERS.items()}
+    database = _ready_db_status()
+
+    return jsonify({
+        'status': 'ready' if database == 'ok' else 'not_ready',
+        'database': database,
+        'degraded': [name for name, state in breakers.items() if state != 'closed'],
+        'circuit_breakers': breakers
+    }), (200 if database == 'ok' else 503)
+
+@app.route('/api/admin/dependencies')
+@admin_required
+def dependencies():
+    """Detailed dependency health, including last errors (admin only)"""
+    return jsonify({
+        'database': _ready_db_status(),
+        'circuit_breakers': {name: breaker.snapshot() for name, breaker in BREAKERS.items()},
+        'ad_secret': ad_secret.status(),
+        'read_replica': ({k: v for k, v in _replica_state.items() if k != 'checked_at'}
+                         if DB_READ_DSN else 'not_configured')
+    })
+
+@app.route('/api/metrics')
+def metrics():
+    """Prometheus text exposition of circuit breaker state"""
+    states = ('closed', 'half_open', 'open')
+    lines = [
+        '# HELP portal_circuit_breaker_state Current breaker state (1 for the active state)',
+        '# TYPE portal_circuit_breaker_state gauge'
+    ]
+    snapshots = {name: breaker.snapshot() for name, breaker in BREAKERS.items()}
+    for name, snap in snapshots.items():
+        for state in states:
+            lines.append(f'portal_circuit_breaker_state{{dependency="{name}",state="{state}"}} {int(snap["state"] == state)}')
+
+    counters = [
+        ('window_calls', 'gauge', 'Calls recorded in the current failure-rate window'),
+        ('window_failures', 'gauge', 'Failures recorded in the current failure-rate window'),
+        ('rejected', 'counter', 'Calls rejected while the breaker was open'),
+        ('trips', 'counter', 'Times the breaker has opened')
+    ]
+    for field, kind, help_text in counters:
+        metric = f'portal_circuit_breaker_{field}' + ('_total' if kind == 'counter' else '')
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, snap in snapshots.items():
+            lines.append(f'{metric}{{dependency="{name}"}} {snap[field]}')
+
+    return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """Most recent captured request profiles (newest first, without stack data)"""
+    profiles = [
+        {k: v for k, v in p.items() if k != 'collapsed'}
+        for p in reversed(profiler.snapshot())
+    ]
+    return jsonify({
+        'enabled': PROFILE_ENABLED,
+        'sample_rate': PROFILE_SAMPLE_RATE,
+        'slow_ms': PROFILE_SLOW_MS,
+        'profiles': profiles
+    })
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """One profile as collapsed stacks (feed to flamegraph.pl or speedscope)"""
+    profile = next((p for p in profiler.snapshot() if p['id'] == profile_id), None)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+    return profile['collapsed'] + '\n', 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     """Login with username/password via Cognito"""
@@ -494,6 +1247,9 @@ def login():
         if error_code == 'NotAuthorizedException':
             return jsonify({'error': 'Invalid username or password'}), 401
         return jsonify({'error': f'Authentication failed: {error_code}'}), 500
+    except CircuitOpenError as e:
+        print(f"Login fast-fail: {e}")
+        return jsonify({'error': 'Authentication service temporarily unavailable'}), 503
     except Exception as e:
         print(f"Login error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -546,16 +1302,23 @@ def change_password():
 
 @app.route('/api/employees', methods=['GET'])
 def get_employees():
-    """Get all active employees"""
+    """Get active employees, one keyset page at a time (?limit=&after_id=)"""
     try:
-        conn = get_db()
+        limit = max(1, min(int(request.args.get('limit', EMPLOYEES_PAGE_SIZE)), EMPLOYEES_MAX_PAGE_SIZE))
+        after_id = int(request.args.get('after_id', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and after_id must be integers'}), 400
+
+    try:
+        conn = get_read_db()
         cur = conn.cursor()
         cur.execute("""
             SELECT employee_id, first_name, last_name, email, department, position, status
             FROM employees 
-            WHERE status = 'active'
+            WHERE status = 'active' AND employee_id > %s
             ORDER BY employee_id ASC
-        """)
+            LIMIT %s
+        """, (after_id, limit + 1))
         
         employees = []
         for row in cur.fetchall():
@@ -572,14 +1335,172 @@ def get_employees():
         cur.close()
         conn.close()
         
-        return jsonify({'employees': employees})
+        # One extra row was fetched only to learn whether another page exists
+        has_more = len(employees) > limit
+        employees = employees[:limit]
+        
+        return jsonify({
+            'employees': employees,
+            'next_after_id': employees[-1]['employee_id'] if has_more else None
+        })
         
     except Exception as e:
         print(f"Database error: {e}")
         return jsonify({'error': 'Failed to fetch employees'}), 500
 
+def _like_escape(value):
+    """Escape LIKE wildcards so user input only ever matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+@app.route('/api/employees/search', methods=['GET'])
+def search_employees():
+    """Ranked typeahead search on name, email and department (prefix first, then fuzzy)"""
+    q = ' '.join(request.args.get('q', '').lower().split())
+    status = request.args.get('status', 'active')
+    # Like /api/employees, the public view is active staff only; anything else is admin-only
+    if status != 'active' and not _is_admin_request():
+        return jsonify({'error': 'Access Denied: Administrator privileges required'}), 403
+    status = None if status == 'all' else status
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), SEARCH_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    if len(q) < 2:
+        return jsonify({'query': q, 'employees': []})
+
+    escaped = _like_escape(q)
+    params = {
+        'q': q,
+        'prefix': f'{escaped}%',
+        'contains': f'%{escaped}%',
+        'status': status,
+        'limit': limit
+    }
+
+    try:
+        conn = get_read_db()
+        cur = conn.cursor()
+        prefix_match = """(lower(first_name) LIKE %(prefix)s
+                    OR lower(last_name) LIKE %(prefix)s
+                    OR lower(email) LIKE %(prefix)s
+                    OR lower(coalesce(department, '')) LIKE %(prefix)s)"""
+        status_match = "(%(status)s IS NULL OR status = %(status)s)"
+
+        # Every candidate branch is an index scan capped at LIMIT, so scoring and sorting
+        # below touch at most a few * limit rows even when a whole department matches
+        branches = [
+            f"""(SELECT employee_id FROM employees
+                WHERE {column} LIKE %(prefix)s AND {status_match}
+                ORDER BY {column} USING ~<~ LIMIT %(limit)s)"""
+            for column in ('lower(first_name)', 'lower(last_name)', 'lower(email)',
+                           "lower(coalesce(department, ''))")
+        ]
+
+        if len(q) >= SEARCH_MIN_FUZZY_LENGTH:
+            cur.execute("SET LOCAL pg_trgm.word_similarity_threshold = %s", (SEARCH_SIMILARITY_THRESHOLD,))
+            # Substring and typo matches via idx_employees_search_trgm (GiST, KNN-ordered)
+            branches.append(f"""(SELECT employee_id FROM employees
+                WHERE search_text LIKE %(contains)s AND {status_match}
+                LIMIT %(limit)s)""")
+            branches.append(f"""(SELECT employee_id FROM employees
+                WHERE %(q)s <%% search_text AND {status_match}
+                ORDER BY search_text <<-> %(q)s LIMIT %(limit)s)""")
+
+        candidates = "\n                UNION\n                ".join(branches)
+        cur.execute(f"""
+            WITH candidates AS (
+                {candidates}
+            )
+            SELECT e.employee_id, e.first_name, e.last_name, e.email, e.department, e.position, e.status,
+                   {prefix_match} AS is_prefix,
+                   word_similarity(%(q)s, e.search_text) AS score
+            FROM employees e
+            JOIN candidates c ON c.employee_id = e.employee_id
+            ORDER BY is_prefix DESC, score DESC, e.employee_id ASC
+            LIMIT %(limit)s
+        """, params)
+
+        employees = []
+        for row in cur.fetchall():
+            employees.append({
+                'employee_id': row[0],
+                'first_name': row[1],
+                'last_name': row[2],
+                'email': row[3],
+                'department': row[4],
+                'position': row[5],
+                'status': row[6],
+                'score': round(float(row[8]), 3)
+            })
+
+        cur.close()
+        conn.close()
+
+        return jsonify({'query': q, 'employees': employees})
+
+    except Exception as e:
+        print(f"Search error: {e}")
+        return jsonify({'error': 'Failed to search employees'}), 500
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Dashboard statistics served from trigger-maintained summary tables"""
+    try:
+        months = max(1, min(int(request.args.get('months', 12)), 120))
+    except ValueError:
+        return jsonify({'error': 'months must be an integer'}), 400
+
+    try:
+        conn = get_read_db()
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT department, status, headcount
+            FROM employee_headcount
+            WHERE headcount > 0
+            ORDER BY department, status
+        """)
+        headcount = {}
+        totals = {}
+        for department, status, count in cur.fetchall():
+            headcount.setdefault(department, {})[status] = count
+            totals[status] = totals.get(status, 0) + count
+
+        cur.execute("""
+            SELECT month, hires, terminations
+            FROM employee_monthly_events
+            WHERE month >= date_trunc('month', CURRENT_DATE) - make_interval(months => %s)
+              AND (hires <> 0 OR terminations <> 0)
+            ORDER BY month ASC
+        """, (months - 1,))
+        monthly = [
+            {'month': month.strftime('%Y-%m'), 'hires': hires, 'terminations': terminations}
+            for month, hires, terminations in cur.fetchall()
+        ]
+
+        cur.execute("SELECT status, total FROM access_request_counts WHERE total > 0")
+        access_requests = dict(cur.fetchall())
+
+        cur.close()
+        conn.close()
+
+        return jsonify({
+            'headcount_by_department': headcount,
+            'headcount_by_status': totals,
+            'monthly': monthly,
+            'access_requests': access_requests,
+            'pending_access_requests': access_requests.get('pending', 0)
+        })
+
+    except Exception as e:
+        print(f"Stats error: {e}")
+        return jsonify({'error': 'Failed to fetch statistics'}), 500
+
 @app.route('/api/create-user', methods=['POST'])
 @admin_required
+@idempotent
 def create_user():
     """Create new employee (Admin only)"""
     try:
@@ -688,6 +1609,9 @@ def create_user():
             'workspace': workspace_status
         }), 201
         
+    except CircuitOpenError as e:
+        print(f"Fast-fail in create-user: {e}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"FATAL ERROR in create-user: {str(e)}")
         import traceback
@@ -696,6 +1620,7 @@ def create_user():
 
 @app.route('/api/terminate-user', methods=['POST'])
 @admin_required
+@idempotent
 def terminate_user():
     """Offboard an employee"""
     try:
@@ -774,7 +1699,7 @@ def sync_computers():
     
     conn = get_ad_connection()
     if not conn:
-        return jsonify({'error': 'Could not connect to AD'}), 500
+        return ad_unavailable_response()
 
     moved_count = 0
     errors = []
@@ -795,22 +1720,14 @@ def sync_computers():
 
             # 3. Get Tags to find the Role
             tags_resp = workspaces.describe_tags(ResourceId=ws_id)
-            role_tag = next((t['Value'] for t in tags_resp['TagList'] if t['Key'] == 'Role'), 'Employee')
-            
-            # Determine Target OU based on Role
-            base_dn = "OU=innovatech,DC=innovatech,DC=local"
+            role_tag = next((t['Value'] for t in tags_resp['TagList'] if t['Key'] == 'Role'), AD_DEFAULT_ROLE)
             
-            if role_tag == 'Developer':
-                target_ou = f"OU=Developers,{base_dn}"
-            elif role_tag == 'Admin':
-                target_ou = f"OU=Admins,{base_dn}"
-            else:
-                # Default for 'Employee' or any other role
-                target_ou = f"OU=Employees,{base_dn}"
+            # Determine Target OU based on Role (unknown roles land in Employees)
+            target_ou = role_ou_dn(role_tag)
 
             # 4. Find the computer in AD
             search_filter = f'(&(objectClass=computer)(sAMAccountName={comp_name}$))'
-            conn.search('DC=innovatech,DC=local', search_filter, attributes=['distinguishedName'])
+            conn.search(AD_DOMAIN_DN, search_filter, attributes=['distinguishedName'])
             
             if not conn.entries:
                 print(f"Computer {comp_name} not found in AD yet.")
@@ -819,7 +1736,7 @@ def sync_computers():
             current_dn = conn.entries[0].distinguishedName.value
             
             # 5. Move if not already in target OU
-            if target_ou not in current_dn:
+            if target_ou.lower() not in current_dn.lower():
                 print(f"Moving {comp_name} to {target_ou}...")
                 try:
                     # modify_dn moves the object
@@ -848,6 +1765,423 @@ def sync_computers():
     finally:
         conn.unbind()
 
+@app.route('/api/maintenance/ad-structure', methods=['POST'])
+@admin_required
+def ad_structure():
+    """Reconcile AD OUs and groups against AD_LAYOUT (?dry_run=true reports the diff only)"""
+    dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true', 'yes')
+    report = reconcile_ad_structure(dry_run=dry_run)
+    if report is None:
+        return ad_unavailable_response()
+    return jsonify(report), (500 if report['errors'] else 200)
+
+# --- IDENTITY DRIFT RECONCILIATION ---
+# Every source is streamed as (username, record) pairs sorted by username, then
+# merge-joined, so memory is bounded by DRIFT_SORT_CHUNK rather than identity count.
+ADS_UF_ACCOUNTDISABLE = 0x2
+WORKSPACE_GONE_STATES = ('TERMINATING', 'TERMINATED')
+
+def identity_key(value):
+    """Join key shared by all systems: the lowercased email local part / sAMAccountName"""
+    return (value or '').split('@')[0].strip().lower()
+
+def _sorted_stream(pairs, chunk_size=None):
+    """Sort an unordered (key, record) stream in bounded memory.
+
+    Records are buffered up to chunk_size; each full buffer is sorted and spilled
+    to a temp file as JSON lines, and the runs are lazily k-way merged.
+    """
+    chunk_size = chunk_size or DRIFT_SORT_CHUNK
+    runs = []
+    buffer = []
+
+    def spill():
+        buffer.sort(key=lambda pair: pair[0])
+        run = tempfile.TemporaryFile(mode='w+')
+        for pair in buffer:
+            run.write(json.dumps(pair) + '\n')
+        run.seek(0)
+        runs.append(run)
+        buffer.clear()
+
+    for pair in pairs:
+        buffer.append(pair)
+        if len(buffer) >= chunk_size:
+            spill()
+
+    if not runs:
+        # Everything fit in one chunk - no disk round trip needed
+        buffer.sort(key=lambda pair: pair[0])
+        yield from (tuple(pair) for pair in buffer)
+        return
+
+    if buffer:
+        spill()
+    try:
+        readers = [(tuple(json.loads(line)) for line in run) for run in runs]
+        yield from heapq.merge(*readers, key=lambda pair: pair[0])
+    finally:
+        for run in runs:
+            run.close()
+
+def stream_db_employees():
+    """Employees from Postgres via a server-side cursor, already sorted by join key"""
+    conn = get_db()
+    try:
+        cur = conn.cursor(name='drift_employees')
+        cur.itersize = DRIFT_PAGE_SIZE
+        # COLLATE "C" gives byte ordering, matching Python string comparison for the merge
+        cur.execute("""
+            SELECT lower(split_part(email, '@', 1)) COLLATE "C" AS username,
+                   employee_id, email, status
+            FROM employees
+            ORDER BY 1
+        """)
+        for username, employee_id, email, status in cur:
+            yield username, {'employee_id': employee_id, 'email': email, 'status': status}
+        cur.close()
+    finally:
+        conn.close()
+
+def stream_cognito_users():
+    """Cognito users via paginated list_users (unordered - sorted by _sorted_stream)"""
+    paginator = cognito.get_paginator('list_users')
+    for page in paginator.paginate(UserPoolId=USER_POOL_ID, PaginationConfig={'PageSize': 60}):
+        for user in page.get('Users', []):
+            attrs = {a['Name']: a['Value'] for a in user.get('Attributes', [])}
+            email = attrs.get('email') or user['Username']
+            yield identity_key(email), {
+                'username': user['Username'],
+                'enabled': user.get('Enabled', True),
+                'user_status': user.get('UserStatus')
+            }
+
+def stream_ad_users(conn):
+    """AD user accounts via a paged LDAP search (unordered - sorted by _sorted_stream)"""
+    entries = conn.extend.standard.paged_search(
+        AD_BASE_DN,
+        '(&(objectCategory=person)(objectClass=user))',
+        search_scope='SUBTREE',
+        attributes=['sAMAccountName', 'userAccountControl', 'distinguishedName'],
+        paged_size=DRIFT_PAGE_SIZE,
+        generator=True
+    )
+    for entry in entries:
+        if entry.get('type') != 'searchResEntry':
+            continue
+        attrs = entry['attributes']
+        uac = attrs.get('userAccountControl') or 0
+        yield identity_key(attrs.get('sAMAccountName')), {
+            'dn': entry['dn'],
+            'enabled': not (int(uac) & ADS_UF_ACCOUNTDISABLE)
+        }
+
+def stream_workspaces():
+    """WorkSpaces in our directory via paginated describe_workspaces (unordered)"""
+    paginator = workspaces.get_paginator('describe_workspaces')
+    for page in paginator.paginate(DirectoryId=DIRECTORY_ID):
+        for ws in page.get('Workspaces', []):
+            yield identity_key(ws.get('UserName')), {
+                'workspace_id': ws.get('WorkspaceId'),
+                'state': ws.get('State')
+            }
+
+def merge_join(streams):
+    """Full outer merge-join of key-sorted streams.
+
+    streams maps source name -> iterator of (key, record) sorted by key. Yields
+    (key, {source: record or None}). If a source has several records for one key,
+    the first is joined and row['duplicates'] maps that source to the record count.
+    """
+    heads = {}
+    grouped = {}
+    for name, stream in streams.items():
+        grouped[name] = itertools.groupby(stream, key=lambda pair: pair[0])
+        heads[name] = next(grouped[name], None)
+
+    previous = None
+    while any(head is not None for head in heads.values()):
+        key = min(head[0] for head in heads.values() if head is not None)
+        if previous is not None and key < previous:
+            raise ValueError(f"Drift source out of order at key {key!r}")
+        previous = key
+
+        row = {}
+        duplicates = {}
+        for name, head in heads.items():
+            if head is not None and head[0] == key:
+                records = [record for _, record in head[1]]
+                row[name] = records[0]
+                if len(records) > 1:
+                    duplicates[name] = len(records)
+                heads[name] = next(grouped[name], None)
+            else:
+                row[name] = None
+        row['duplicates'] = duplicates
+        yield key, row
+
+def classify_drift(row, ad_enabled, ws_enabled):
+    """Return (issue, remediation) pairs for one joined identity"""
+    if row.get('duplicates'):
+        # Ambiguous identity (e.g. same local part in two email domains): report, never auto-fix
+        return [(f'duplicate_{source}_identity', None) for source in sorted(row['duplicates'])] + [
+            (issue, None) for issue, _ in classify_drift(dict(row, duplicates={}), ad_enabled, ws_enabled)
+        ]
+
+    db, cog, ad, ws = row['db'], row['cognito'], row.get('ad'), row.get('workspaces')
+    issues = []
+    ws_live = ws is not None and ws['state'] not in WORKSPACE_GONE_STATES
+
+    if db is None:
+        if cog is not None:
+            issues.append(('orphan_cognito_user', None))
+        if ad_enabled and ad is not None and ad['enabled']:
+            issues.append(('orphan_ad_user', None))
+        if ws_enabled and ws_live:
+            issues.append(('orphan_workspace', None))
+        return issues
+
+    if db['status'] == 'terminated':
+        if cog is not None and cog['enabled']:
+            issues.append(('cognito_enabled_for_terminated', 'disable_cognito'))
+        if ad_enabled and ad is not None and ad['enabled']:
+            issues.append(('ad_enabled_for_terminated', 'disable_ad'))
+        if ws_enabled and ws_live:
+            issues.append(('workspace_for_terminated', 'terminate_workspace'))
+    elif db['status'] == 'active':
+        if cog is None:
+            issues.append(('missing_cognito_user', None))
+        elif not cog['enabled']:
+            issues.append(('cognito_disabled_for_active', None))
+        if ad_enabled and ws_enabled and ad is None:
+            issues.append(('missing_ad_user', None))
+    return issues
+
+def remediate_drift(action, row, ad_conn):
+    """Apply one auto-remediation; only ever disables/terminates for terminated employees"""
+    if action == 'disable_cognito':
+        cognito.admin_disable_user(UserPoolId=USER_POOL_ID, Username=row['cognito']['username'])
+        return True
+    if action == 'disable_ad':
+        return ad_conn.modify(row['ad']['dn'], {'userAccountControl': [(MODIFY_REPLACE, [514])]})
+    if action == 'terminate_workspace':
+        resp = workspaces.terminate_workspaces(
+            TerminateWorkspaceRequests=[{'WorkspaceId': row['workspaces']['workspace_id']}]
+        )
+        return not resp.get('FailedRequests')
+    return False
+
+def reconcile_identities(remediate=False, max_items=1000):
+    """Stream Postgres, Cognito, AD and WorkSpaces, merge-join by username and report drift"""
+    print(f"🔍 Starting identity drift reconciliation (remediate={remediate})...")
+
+    ws_enabled = bool(DIRECTORY_ID and BUNDLE_ID)
+    ad_conn = get_ad_connection()
+
+    streams = {
+        'db': stream_db_employees(),
+        'cognito': _sorted_stream(stream_cognito_users())
+    }
+    if ad_conn:
+        streams['ad'] = _sorted_stream(stream_ad_users(ad_conn))
+    if ws_enabled:
+        streams['workspaces'] = _sorted_stream(stream_workspaces())
+
+    report = {
+        'remediate': remediate,
+        'sources': {
+            'db': True,
+            'cognito': True,
+            'ad': ad_conn is not None,
+            'workspaces': ws_enabled
+        },
+        'identities_scanned': 0,
+        'counts': {},
+        'drift': [],
+        'truncated': False,
+        'remediated': 0,
+        'errors': []
+    }
+
+    try:
+        for key, row in merge_join(streams):
+            report['identities_scanned'] += 1
+            for issue, action in classify_drift(row, ad_conn is not None, ws_enabled):
+                report['counts'][issue] = report['counts'].get(issue, 0) + 1
+                item = {'username': key, 'issue': issue}
+
+                if remediate and action:
+                    try:
+                        item['remediated'] = bool(remediate_drift(action, row, ad_conn))
+                        if item['remediated']:
+                            report['remediated'] += 1
+                            print(f"🔧 {action} for {key}")
+                    except Exception as e:
+                        item['remediated'] = False
+                        report['errors'].append(f"{key} {action}: {e}")
+
+                if len(report['drift']) < max_items:
+                    report['drift'].append(item)
+                else:
+                    report['truncated'] = True
+
+        print(f"✓ Drift scan: {report['identities_scanned']} identities, {sum(report['counts'].values())} issues")
+        return report
+    finally:
+        if ad_conn:
+            ad_conn.unbind()
+
+def run_drift_job(job_id, remediate, max_items, lock_conn):
+    """Background worker: run the scan and persist the report on the job row.
+
+    lock_conn holds the drift advisory lock for the whole run and carries the
+    heartbeats; if the pod dies the session ends, the lock is released and the
+    job goes stale (see get_drift_job).
+    """
+    cur = lock_conn.cursor()
+    done = threading.Event()
+
+    # Beat from a side thread: the sort phase can run for minutes before the first identity
+    def heartbeat():
+        beat_cur = lock_conn.cursor()
+        while not done.wait(DRIFT_HEARTBEAT_SECONDS):
+            try:
+                beat_cur.execute("UPDATE drift_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE job_id = %s", (job_id,))
+            except Exception as e:
+                print(f"Drift job {job_id} heartbeat failed: {e}")
+        beat_cur.close()
+
+    beat_thread = threading.Thread(target=heartbeat, name=f'drift-heartbeat-{job_id}', daemon=True)
+    beat_thread.start()
+
+    def finish(status, report=None, error=None):
+        cur.execute("""
+            UPDATE drift_jobs
+            SET status = %s, report = %s, error = %s,
+                finished_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s
+        """, (status, Json(report) if report is not None else None, error, job_id))
+
+    try:
+        report = reconcile_identities(remediate=remediate, max_items=max_items)
+        done.set()
+        beat_thread.join()
+        finish('completed', report=report)
+    except Exception as e:
+        print(f"Drift reconciliation job {job_id} failed: {e}")
+        done.set()
+        beat_thread.join()
+        try:
+            finish('failed', error=str(e))
+        except Exception as save_error:
+            print(f"Could not record failure of drift job {job_id}: {save_error}")
+    finally:
+        done.set()
+        cur.close()
+        lock_conn.close()
+
+@app.route('/api/maintenance/reconcile-identities', methods=['POST'])
+@admin_required
+def reconcile_identities_route():
+    """Start a drift scan across Postgres, Cognito, AD and WorkSpaces (?remediate=true to fix).
+
+    Large scans outlive the proxy timeout, so this only queues the job and returns
+    its id; poll GET /api/maintenance/reconcile-identities/<job_id> for the report.
+    Only one scan runs at a time across all pods.
+    """
+    remediate = request.args.get('remediate', 'false').lower() in ('1', 'true', 'yes')
+    try:
+        max_items = min(int(request.args.get('max_items', 1000)), 10000)
+    except ValueError:
+        return jsonify({'error': 'max_items must be an integer'}), 400
+
+    try:
+        lock_conn = get_db()
+        lock_conn.autocommit = True
+    except Exception as e:
+        print(f"Could not create drift job: {e}")
+        return jsonify({'error': 'Failed to start reconciliation job'}), 500
+
+    try:
+        cur = lock_conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (DRIFT_JOB_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            cur.close()
+            lock_conn.close()
+            return jsonify({'error': 'A reconciliation job is already running'}), 409
+
+        cur.execute("""
+            INSERT INTO drift_jobs (remediate, max_items, status, heartbeat_at)
+            VALUES (%s, %s, 'running', CURRENT_TIMESTAMP)
+            RETURNING job_id
+        """, (remediate, max_items))
+        job_id = str(cur.fetchone()[0])
+        cur.close()
+    except Exception as e:
+        print(f"Could not create drift job: {e}")
+        lock_conn.close()
+        return jsonify({'error': 'Failed to start reconciliation job'}), 500
+
+    threading.Thread(
+        target=run_drift_job,
+        args=(job_id, remediate, max_items, lock_conn),
+        name=f'drift-job-{job_id}',
+        daemon=True
+    ).start()
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'running',
+        'status_url': f'/api/maintenance/reconcile-identities/{job_id}'
+    }), 202
+
+@app.route('/api/maintenance/reconcile-identities/<job_id>', methods=['GET'])
+@admin_required
+def get_drift_job(job_id):
+    """Status of a drift job, with its report once completed"""
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid job id'}), 400
+
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        # A running job whose worker stopped heartbeating (pod restart, OOM kill) is failed
+        cur.execute("""
+            UPDATE drift_jobs
+            SET status = 'failed', error = 'Worker lost (no heartbeat)', finished_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s AND status = 'running'
+              AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        """, (job_id, DRIFT_JOB_STALE_SECONDS))
+        cur.execute("""
+            SELECT status, remediate, report, error, started_at, finished_at, heartbeat_at
+            FROM drift_jobs
+            WHERE job_id = %s
+        """, (job_id,))
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({'error': 'Failed to fetch job'}), 500
+
+    if not row:
+        return jsonify({'error': 'Job not found'}), 404
+
+    status, remediate, report, error, started_at, finished_at, heartbeat_at = row
+    return jsonify({
+        'job_id': job_id,
+        'status': status,
+        'remediate': remediate,
+        'started_at': started_at.isoformat() if started_at else None,
+        'heartbeat_at': heartbeat_at.isoformat() if heartbeat_at else None,
+        'finished_at': finished_at.isoformat() if finished_at else None,
+        'error': error,
+        'report': report
+    })
+
 # --- STARTUP: Initialize AD Structure ---
 if __name__ == '__main__':
     print("=" * 80)
@@ -856,8 +2190,7 @@ if __name__ == '__main__':
     
     # Auto-create OUs and groups if service account is available
     try:
-        ensure_ou_structure()
-        ensure_security_groups()
+        reconcile_ad_structure()
     except Exception as e:
         print(f"⚠️ Could not initialize AD structure: {e}")
         print(f"⚠️ Continuing without automated AD setup")
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class StubSecretsManager:
+    """Stands in for the boto3 client; fails until `available` is set"""
+
+    def __init__(self, secret):
+        self.secret = secret
+        self.available = False
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_secret_value(self, SecretId):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.01)
+        if not self.available:
+            raise RuntimeError('Secrets Manager unreachable')
+        return {'SecretString': json.dumps(self.secret)}
+
+
+FALLBACK = {'username': 'Admin', 'password': ''}
+SECRET = {'username': 'svc-automation', 'password': 'rotated'}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = StubSecretsManager(SECRET)
+    monkeypatch.setattr(app, 'secretsmanager', stub)
+    return stub
+
+
+def make_cache(retry_seconds=0):
+    return app.SecretCache('test-secret', ttl_seconds=3600, refresh_ahead_seconds=300,
+                           retry_seconds=retry_seconds, fallback=lambda: dict(FALLBACK))
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_fallback_is_replaced_once_secrets_manager_recovers(stub):
+    cache = make_cache()
+
+    assert cache.get() == FALLBACK
+    assert cache.status()['source'] == 'fallback'
+
+    stub.available = True
+    cache.get()  # kicks off the background retry
+    assert wait_for(lambda: cache.get() == SECRET)
+    assert cache.status()['source'] == 'secretsmanager'
+
+
+def test_stale_value_is_served_when_refresh_fails(stub):
+    stub.available = True
+    cache = make_cache()
+    assert cache.get() == SECRET
+
+    stub.available = False
+    assert cache.refresh() is False
+    assert cache.get() == SECRET
+    assert cache.status()['last_error']
+
+
+def test_refresh_now_is_rate_limited(stub):
+    stub.available = True
+    cache = make_cache(retry_seconds=60)
+    cache.get()
+    calls = stub.calls
+
+    assert cache.refresh_now() is False
+    assert stub.calls == calls
+
+
+def test_concurrent_first_load_fetches_once(stub):
+    stub.available = True
+    cache = make_cache()
+
+    threads = [threading.Thread(target=cache.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stub.calls == 1
+    assert cache.get() == SECRET
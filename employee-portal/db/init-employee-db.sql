@@ -5,6 +5,7 @@
 
 -- Create extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- ============================================================================
 -- TABLE: departments
@@ -36,6 +37,12 @@ CREATE TABLE IF NOT EXISTS employees (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Lowercased name/email/department blob backing /api/employees/search (trigram indexed below)
+ALTER TABLE employees ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (
+        lower(first_name || ' ' || last_name || ' ' || email || ' ' || coalesce(department, ''))
+    ) STORED;
+
 -- ============================================================================
 -- TABLE: access_requests
 -- ============================================================================
@@ -77,6 +84,58 @@ CREATE TABLE IF NOT EXISTS audit_logs (
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- ============================================================================
+-- TABLE: idempotency_keys (cached responses for retried lifecycle calls)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idempotency_key VARCHAR(255) NOT NULL,
+    scope VARCHAR(100) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code INTEGER NOT NULL,
+    response_body JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (idempotency_key, scope)
+);
+
+-- ============================================================================
+-- TABLE: drift_jobs (background identity drift reconciliation runs)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS drift_jobs (
+    job_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    remediate BOOLEAN NOT NULL DEFAULT FALSE,
+    max_items INTEGER NOT NULL,
+    report JSONB,
+    error TEXT,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+ALTER TABLE drift_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- ============================================================================
+-- SUMMARY TABLES: statistics for /api/stats (maintained by triggers below)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS employee_headcount (
+    department VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    headcount INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (department, status)
+);
+
+CREATE TABLE IF NOT EXISTS employee_monthly_events (
+    month DATE PRIMARY KEY,
+    hires INTEGER NOT NULL DEFAULT 0,
+    terminations INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS access_request_counts (
+    status VARCHAR(20) PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+);
+
 -- ============================================================================
 -- INDEXES (idempotent - drop first, then create)
 -- ============================================================================
@@ -88,6 +147,12 @@ DROP INDEX IF EXISTS idx_access_requests_status;
 DROP INDEX IF EXISTS idx_onboarding_employee;
 DROP INDEX IF EXISTS idx_audit_employee;
 DROP INDEX IF EXISTS idx_audit_timestamp;
+DROP INDEX IF EXISTS idx_employees_search_trgm;
+DROP INDEX IF EXISTS idx_employees_first_name_prefix;
+DROP INDEX IF EXISTS idx_employees_last_name_prefix;
+DROP INDEX IF EXISTS idx_employees_email_prefix;
+DROP INDEX IF EXISTS idx_employees_department_prefix;
+DROP INDEX IF EXISTS idx_idempotency_expires;
 
 CREATE INDEX idx_employees_email ON employees(email);
 CREATE INDEX idx_employees_status ON employees(status);
@@ -98,6 +163,18 @@ CREATE INDEX idx_onboarding_employee ON onboarding_tasks(employee_id);
 CREATE INDEX idx_audit_employee ON audit_logs(employee_id);
 CREATE INDEX idx_audit_timestamp ON audit_logs(timestamp);
 
+-- Typeahead search: trigram GiST serves LIKE '%q%', word-similarity (typo) lookups and
+-- KNN ordering (search_text <<-> q), so fuzzy candidates stop after LIMIT rows
+CREATE INDEX idx_employees_search_trgm ON employees USING GIST (search_text gist_trgm_ops);
+
+-- Two-character typeahead: pg_trgm has no trigrams for '%xy%', so those queries use anchored prefixes
+CREATE INDEX idx_employees_first_name_prefix ON employees (lower(first_name) text_pattern_ops);
+CREATE INDEX idx_employees_last_name_prefix ON employees (lower(last_name) text_pattern_ops);
+CREATE INDEX idx_employees_email_prefix ON employees (lower(email) text_pattern_ops);
+CREATE INDEX idx_employees_department_prefix ON employees (lower(coalesce(department, '')) text_pattern_ops);
+
+CREATE INDEX idx_idempotency_expires ON idempotency_keys(expires_at);
+
 -- ============================================================================
 -- FUNCTION & TRIGGER (idempotent - drop first, then create)
 -- ============================================================================
@@ -117,6 +194,132 @@ CREATE TRIGGER update_employees_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- ============================================================================
+-- STATISTICS TRIGGERS (idempotent - drop first, then create)
+-- Each row change applies +/- deltas, so /api/stats never scans employees
+-- ============================================================================
+DROP TRIGGER IF EXISTS employees_stats_insert_delete ON employees;
+DROP TRIGGER IF EXISTS employees_stats_update ON employees;
+DROP TRIGGER IF EXISTS access_requests_stats_insert_delete ON access_requests;
+DROP TRIGGER IF EXISTS access_requests_stats_update ON access_requests;
+DROP FUNCTION IF EXISTS maintain_employee_stats();
+DROP FUNCTION IF EXISTS maintain_access_request_stats();
+DROP FUNCTION IF EXISTS apply_employee_stats(VARCHAR, VARCHAR, DATE, DATE, INTEGER);
+
+CREATE OR REPLACE FUNCTION apply_employee_stats(p_department VARCHAR, p_status VARCHAR,
+                                                p_hire_date DATE, p_termination_date DATE,
+                                                p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO employee_headcount (department, status, headcount)
+    VALUES (COALESCE(p_department, 'Unassigned'), COALESCE(p_status, 'unknown'), p_delta)
+    ON CONFLICT (department, status)
+    DO UPDATE SET headcount = employee_headcount.headcount + EXCLUDED.headcount;
+
+    IF p_hire_date IS NOT NULL THEN
+        INSERT INTO employee_monthly_events (month, hires)
+        VALUES (date_trunc('month', p_hire_date)::DATE, p_delta)
+        ON CONFLICT (month)
+        DO UPDATE SET hires = employee_monthly_events.hires + EXCLUDED.hires;
+    END IF;
+
+    IF p_termination_date IS NOT NULL THEN
+        INSERT INTO employee_monthly_events (month, terminations)
+        VALUES (date_trunc('month', p_termination_date)::DATE, p_delta)
+        ON CONFLICT (month)
+        DO UPDATE SET terminations = employee_monthly_events.terminations + EXCLUDED.terminations;
+    END IF;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION maintain_employee_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_employee_stats(OLD.department, OLD.status, OLD.hire_date, OLD.termination_date, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_employee_stats(NEW.department, NEW.status, NEW.hire_date, NEW.termination_date, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION maintain_access_request_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE access_request_counts SET total = total - 1
+        WHERE status = COALESCE(OLD.status, 'unknown');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO access_request_counts (status, total)
+        VALUES (COALESCE(NEW.status, 'unknown'), 1)
+        ON CONFLICT (status)
+        DO UPDATE SET total = access_request_counts.total + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER employees_stats_insert_delete
+    AFTER INSERT OR DELETE ON employees
+    FOR EACH ROW
+    EXECUTE FUNCTION maintain_employee_stats();
+
+-- Only fire when a counted column actually changes
+CREATE TRIGGER employees_stats_update
+    AFTER UPDATE OF department, status, hire_date, termination_date ON employees
+    FOR EACH ROW
+    WHEN (OLD.department IS DISTINCT FROM NEW.department
+          OR OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.hire_date IS DISTINCT FROM NEW.hire_date
+          OR OLD.termination_date IS DISTINCT FROM NEW.termination_date)
+    EXECUTE FUNCTION maintain_employee_stats();
+
+CREATE TRIGGER access_requests_stats_insert_delete
+    AFTER INSERT OR DELETE ON access_requests
+    FOR EACH ROW
+    EXECUTE FUNCTION maintain_access_request_stats();
+
+CREATE TRIGGER access_requests_stats_update
+    AFTER UPDATE OF status ON access_requests
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION maintain_access_request_stats();
+
+-- Full rebuild from the base tables; used at init and to repair any drift
+CREATE OR REPLACE FUNCTION rebuild_stats()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE employees, access_requests IN SHARE MODE;
+
+    DELETE FROM employee_headcount;
+    INSERT INTO employee_headcount (department, status, headcount)
+    SELECT COALESCE(department, 'Unassigned'), COALESCE(status, 'unknown'), COUNT(*)
+    FROM employees
+    GROUP BY 1, 2;
+
+    DELETE FROM employee_monthly_events;
+    INSERT INTO employee_monthly_events (month, hires, terminations)
+    SELECT month, SUM(hires), SUM(terminations)
+    FROM (
+        SELECT date_trunc('month', hire_date)::DATE AS month, 1 AS hires, 0 AS terminations
+        FROM employees WHERE hire_date IS NOT NULL
+        UNION ALL
+        SELECT date_trunc('month', termination_date)::DATE, 0, 1
+        FROM employees WHERE termination_date IS NOT NULL
+    ) events
+    GROUP BY month;
+
+    DELETE FROM access_request_counts;
+    INSERT INTO access_request_counts (status, total)
+    SELECT COALESCE(status, 'unknown'), COUNT(*)
+    FROM access_requests
+    GROUP BY 1;
+END;
+$$ language 'plpgsql';
+
 -- ============================================================================
 -- SAMPLE DATA (insert only if not exists)
 -- ============================================================================
@@ -151,6 +354,9 @@ INSERT INTO employees (first_name, last_name, email, department, position, statu
 SELECT 'Alice', 'Williams', 'alice.williams@innovatech.local', 'Finance', 'Financial Analyst', 'active'
 WHERE NOT EXISTS (SELECT 1 FROM employees WHERE email = 'alice.williams@innovatech.local');
 
+-- Bring summary tables in line with existing rows (safe to re-run)
+SELECT rebuild_stats();
+
 -- ============================================================================
 -- VERIFICATION
 -- ============================================================================